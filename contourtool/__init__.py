@@ -23,7 +23,7 @@ from __future__ import print_function
 import sys
 import usb
 import argparse
-from . import astm, controlchars, meter, output
+from . import astm, controlchars, filters, meter, output
 
 
 __version__ = '0.1'
@@ -33,12 +33,22 @@ def print_error(msg, kind="error"):
     print("{kind}: {msg}".format(kind=kind, msg=msg), file=sys.stderr)
 
 
-def print_header(header, args, file=sys.stderr):
+def check_header(header):
+    """
+    Check a header record comes from a supported meter and return its
+    product, versions, serial and SKU fields.
+    """
     product, versions, serial, sku = header.fields.sender_id.split("^")
     if product != "Bayer7410":
         raise IOError("Unsupported product ID '{}'".format(product))
     if header.fields.processing_id != "P":
-        raise IOError("Invalid processing ID '{}'".format(header.processing_id))
+        raise IOError("Invalid processing ID '{}'".format(
+            header.fields.processing_id))
+    return product, versions, serial, sku
+
+
+def print_header(header, args, file=sys.stderr):
+    product, versions, serial, sku = check_header(header)
     if args.info:
         print("Product: {product}".format(product=product), file=file)
         print("Versions: {0}, {1}, {2}".format(
@@ -46,23 +56,48 @@ def print_header(header, args, file=sys.stderr):
         print("Serial: {}".format(serial), file=file)
         print("SKU: {}".format(sku), file=file)
         print(header.format("{nr_results} results on meter"), file=file)
+    return product, versions, serial, sku
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Retrieve data from a connected Contour Next USB meter"
-        " and write to a CSV file.",
-        epilog="NOTE: This program is experimental software, not developed"
-        " or supported by Bayer. It might damage your meter or render it"
-        " unreliable."
-        " See the README.rst file for more information and bug reporting"
-        " instructions.")
-
-    output_group = parser.add_argument_group("output")
-    output_group.add_argument(
-        "-o", "--output", type=argparse.FileType("w"), default=sys.stdout,
-        help="output file (default stdout)")
-
+def read_header(frames):
+    """
+    Return the header record from the start of a sequence of captured
+    frames.
+    """
+    try:
+        header = next(frames).get_record()
+    except StopIteration:
+        raise astm.FormatError("No ASTM frames in dump")
+    if header.fields.type != "H":
+        raise astm.FormatError("Dump does not start with a header record")
+    return header
+
+
+def check_termination(record):
+    if record.fields.type != "L":
+        raise IOError("End frame is not a termination record")
+    if record.fields.termination_code != "N":
+        raise IOError("Abnormal termination, data might be bad")
+
+
+def write_results(frames, out, record_filter):
+    """
+    Write the wanted results from already captured frames (following
+    the header) to an output. Return the number of results written.
+    """
+    nr_results = 0
+    for frame in frames:
+        record = frame.get_record()
+        if record.fields.type == "R" and record_filter.wants(record):
+            out.write_record(record)
+            nr_results += 1
+        if frame.is_end_frame():
+            check_termination(record)
+            return nr_results
+    raise IOError("Dump ends without a termination record")
+
+
+def add_unit_arguments(parser):
     units_group = parser.add_argument_group("units")
     units_group.add_argument(
         "--glucose-units", default="mmol/l",
@@ -79,6 +114,83 @@ def main():
         "--g-per-choice", default=15.0, type=float, metavar="GRAMS",
         help="set grams per carbohydrate choice (default 15)")
 
+
+def download(args, record_filter):
+    m = meter.NextUSB(args)
+    out = output.formats[args.format](args)
+
+    # initialise
+    m.init()
+    header = m.read_frame()
+    if args.astm_dump is not None:
+        args.astm_dump.write(header.raw_data)
+    header = header.get_record()
+    product, versions, serial, sku = print_header(header, args)
+    # The meter still has to be read to the end, even if none of its
+    # results are wanted.
+    skip_all = not record_filter.wants_header(header, serial)
+    m.expect(controlchars.ENQ)
+    m.acknowledge()
+
+    # read data
+    while True:
+        frame = m.read_frame()
+        # read_frame() has already checked the frame, so acknowledge it
+        # before doing anything that might block on the output.
+        m.acknowledge()
+        if args.astm_dump is not None:
+            args.astm_dump.write(frame.raw_data)
+        if not skip_all:
+            record = frame.get_record()
+            if record.fields.type == "R" and record_filter.wants(record):
+                out.write_record(record)
+        if frame.is_end_frame():
+            check_termination(frame.get_record())
+            m.expect(controlchars.EOT)
+            break
+    return out
+
+
+def replay(args, record_filter):
+    out = output.formats[args.format](args)
+    frames = astm.read_frames(args.replay.read())
+    header = read_header(frames)
+    product, versions, serial, sku = print_header(header, args)
+    if record_filter.wants_header(header, serial):
+        write_results(frames, out, record_filter)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Retrieve data from a connected Contour Next USB meter"
+        " and write to a file.",
+        epilog="NOTE: This program is experimental software, not developed"
+        " or supported by Bayer. It might damage your meter or render it"
+        " unreliable."
+        " See the README.rst file for more information and bug reporting"
+        " instructions.")
+
+    output_group = parser.add_argument_group("output")
+    output_group.add_argument(
+        "-o", "--output", type=argparse.FileType("w"), default=sys.stdout,
+        help="output file (default stdout)")
+    output_group.add_argument(
+        "--format", default="csv", choices=sorted(output.formats),
+        help="output format: CSV, or JSON Lines with one object per"
+        " result (default csv)")
+    output_group.add_argument(
+        "--flush-records", default=1, type=int, metavar="N",
+        help="with --format jsonl, flush the output after this many"
+        " results, or 0 to leave it to the OS (default 1)")
+    output_group.add_argument(
+        "--flush-interval", type=float, metavar="SECONDS",
+        help="with --format jsonl, flush each result within this long of"
+        " writing it, even if no more results arrive")
+
+    add_unit_arguments(parser)
+    filters.add_filter_arguments(parser)
+
     debug_group = parser.add_argument_group("debugging")
     debug_group.add_argument(
         "-v", dest="verbosity", default=0, action="count",
@@ -88,6 +200,10 @@ def main():
     debug_group.add_argument(
         "--astm-dump", type=argparse.FileType("wb"), metavar="FILE",
         help="dump raw ASTM frames to this file")
+    debug_group.add_argument(
+        "--replay", type=argparse.FileType("rb"), metavar="FILE",
+        help="read results from a file written by --astm-dump instead of"
+        " a meter")
     debug_group.add_argument(
         "--version", action='version', version='%(prog)s ' + __version__)
 
@@ -95,34 +211,13 @@ def main():
     success = False
 
     try:
-        m = meter.NextUSB(args)
-        out = output.CSV(args)
-
-        # initialise
-        m.init()
-        header = m.read_frame()
-        print_header(header.get_record(), args)
-        m.expect(controlchars.ENQ)
-        m.acknowledge()
+        record_filter = filters.RecordFilter(args)
+        if args.replay is not None:
+            out = replay(args, record_filter)
+        else:
+            out = download(args, record_filter)
 
-        # read data
-        while True:
-            frame = m.read_frame()
-            if args.astm_dump is not None:
-                args.astm_dump.write(frame.raw_data)
-            record = frame.get_record()
-            if record.fields.type == "R":
-                out.write_record(record)
-            m.acknowledge()
-            if frame.is_end_frame():
-                if record.fields.type != "L":
-                    raise IOError("End frame is not a termination record")
-                if record.fields.termination_code != "N":
-                    raise IOError("Abnormal termination, data might be bad")
-                m.expect(controlchars.EOT)
-                break
-
-        args.output.close()
+        out.close()
         success = True
     except IOError as e:
         print_error(e, "IO or protocol error")
@@ -64,6 +64,50 @@ class Frame(object):
             data=self.match.group('data')[:6]+'...')
 
 
+def read_frames(data):
+    """
+    Split a raw ASTM dump (as written by --astm-dump) into frames.
+    Anything between frames, such as stray control characters, is
+    skipped.
+    """
+    pos = data.find(controlchars.STX)
+    previous = None
+    while pos != -1:
+        end = data.find("\r\n", pos)
+        if end == -1:
+            raise FormatError("Truncated ASTM frame at end of dump")
+        end += 2
+        raw_data = data[pos:end]
+        # A frame read together with the start of the next one keeps
+        # that data in its trailer, so the next frame can show up
+        # twice in a dump. Frame numbers always advance, so drop
+        # exact repeats.
+        if raw_data != previous:
+            yield Frame(raw_data)
+        previous = raw_data
+        pos = data.find(controlchars.STX, end)
+
+
+# Field layouts for each record type, by the record type character
+record_types = {
+    'H': namedtuple(
+        "HeaderRecord",
+        "type delimiters unknown1 unknown2 sender_id info nr_results"
+        " unknown3 unknown4 unknown5 unknown6 processing_id"
+        " spec_version timestamp".split()),
+    'P': namedtuple(
+        "PatientRecord",
+        "type sequence".split()),
+    'R': namedtuple(
+        "ResultRecord",
+        "type sequence record_id value units_ref unknown1 markers"
+        " unknown2 timestamp".split()),
+    'L': namedtuple(
+        "TerminatorRecord",
+        "type sequence read_key termination_code".split())
+}
+
+
 class Record(object):
     def __init__(self, raw_data):
         if raw_data.endswith("\r"):
@@ -71,23 +115,7 @@ class Record(object):
             # to end with a CR, which doesn't seem to be part of the
             # record.
             raw_data = raw_data[:-1]
-        self.fields = {
-            'H': namedtuple(
-                "HeaderRecord",
-                "type delimiters unknown1 unknown2 sender_id info nr_results"
-                " unknown3 unknown4 unknown5 unknown6 processing_id"
-                " spec_version timestamp".split()),
-            'P': namedtuple(
-                "PatientRecord",
-                "type sequence".split()),
-            'R': namedtuple(
-                "ResultRecord",
-                "type sequence record_id value units_ref unknown1 markers"
-                " unknown2 timestamp".split()),
-            'L': namedtuple(
-                "TerminatorRecord",
-                "type sequence read_key termination_code".split())
-        }[raw_data[0]](*raw_data.split("|"))
+        self.fields = record_types[raw_data[0]](*raw_data.split("|"))
 
     def format(self, template):
         return template.format(**self.fields._asdict())
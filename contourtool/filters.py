@@ -0,0 +1,128 @@
+"""
+Part of contourtool.py - read data from Contour Next USB blood glucose meters
+Copyright (C) 2016 Ben Jones <benj2579@gmail.com>
+See the COPYING file for licence information.
+"""
+
+# Filters for choosing which results to output. These check the record
+# fields, so unwanted results are dropped before they're parsed and
+# converted.
+
+import re
+import argparse
+from . import output
+
+
+result_types = set(
+    ["Glucose", "Carb", "Insulin"] + list(output.insulin_types.values()))
+
+date_re = re.compile(
+    r"^(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})"
+    r"(?: (?P<hour>\d{2}):(?P<minute>\d{2}))?$")
+
+
+def parse_date(text, end_of_day=False):
+    """
+    Convert a date in output format (YYYY-MM-DD or YYYY-MM-DD HH:MM) to
+    the YYYYMMDDHHMM format the meter uses, which sorts the same way as
+    the times it represents.
+    """
+    match = date_re.match(text)
+    if not match:
+        raise argparse.ArgumentTypeError(
+            "expected YYYY-MM-DD or 'YYYY-MM-DD HH:MM', got '{}'".format(
+                text))
+    fields = match.groupdict()
+    if fields["hour"] is None:
+        fields["hour"], fields["minute"] = (
+            ("23", "59") if end_of_day else ("00", "00"))
+    return "{year}{month}{day}{hour}{minute}".format(**fields)
+
+
+def parse_until(text):
+    return parse_date(text, end_of_day=True)
+
+
+def parse_types(text):
+    types = set(t.strip() for t in text.split(","))
+    unknown = types - result_types
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            "unknown result type(s) {}, choose from {}".format(
+                ", ".join(sorted(unknown)), ", ".join(sorted(result_types))))
+    return types
+
+
+def add_filter_arguments(parser):
+    filter_group = parser.add_argument_group("filters")
+    filter_group.add_argument(
+        "--since", type=parse_date, metavar="DATE",
+        help="only output results from this date or time on"
+        " (YYYY-MM-DD or 'YYYY-MM-DD HH:MM')")
+    filter_group.add_argument(
+        "--until", type=parse_until, metavar="DATE",
+        help="only output results up to and including this date or time")
+    filter_group.add_argument(
+        "--types", type=parse_types, metavar="TYPE,...",
+        help="only output these result types (Glucose, Carb, Insulin or"
+        " a specific insulin type such as FastActingInsulin)")
+    filter_group.add_argument(
+        "--serial", action="append", metavar="SERIAL",
+        help="only output results from the meter with this serial number"
+        " (can be repeated)")
+
+
+class RecordFilter(object):
+    def __init__(self, args):
+        self.since = args.since
+        self.until = args.until
+        self.serials = set(args.serial) if args.serial else None
+        self.result_types = None
+        self.insulin_units = None
+        if args.types:
+            self.result_types = set(
+                t for t in args.types if t in ("Glucose", "Carb", "Insulin"))
+            if "Insulin" not in args.types:
+                # Only some insulins: check the unit code as well.
+                self.insulin_units = set(
+                    code for code, name in output.insulin_types.items()
+                    if name in args.types)
+                if self.insulin_units:
+                    self.result_types.add("Insulin")
+
+    def wants_header(self, header, serial):
+        """
+        Check whether a meter with this header record and serial number
+        might have any wanted results.
+        """
+        if self.serials is not None and serial not in self.serials:
+            return False
+        # Results can't be newer than the time the meter was read.
+        if (self.since is not None and
+                header.fields.timestamp[:12] < self.since):
+            return False
+        return True
+
+    def wants(self, record):
+        """
+        Check whether a record is wanted. Anything other than a result
+        record always is.
+        """
+        fields = record.fields
+        if fields.type != "R":
+            return True
+        if self.since is not None or self.until is not None:
+            # Raise FormatError for a bad timestamp rather than
+            # comparing it.
+            output.parse_timestamp(fields.timestamp)
+            if self.since is not None and fields.timestamp < self.since:
+                return False
+            if self.until is not None and fields.timestamp > self.until:
+                return False
+        if self.result_types is not None:
+            result_type = output.parse_record_id(fields.record_id)
+            if result_type not in self.result_types:
+                return False
+            if result_type == "Insulin" and self.insulin_units is not None:
+                return fields.units_ref.split("^")[0] in self.insulin_units
+        return True
@@ -7,9 +7,25 @@ See the COPYING file for licence information.
 # small classes for record output
 
 import csv
+import json
+import threading
 from . import astm
 
 
+# result types for the insulin unit codes
+insulin_types = {
+    "0": "UnknownInsulin",
+    "1": "FastActingInsulin",
+    "2": "LongActingInsulin",
+    "3": "MixedInsulin",
+}
+
+fieldnames = ["Sequence", "Timestamp", "Type", "Value",
+              "BelowScale", "AboveScale", "BeforeMeal", "AfterMeal",
+              "DontFeelRight", "Fasting", "Sick", "Stress",
+              "Activity", "HoursAfterMeal"]
+
+
 def convert_unit(type, from_value, from_unit, args):
     """
     Convert a value to preferred units and round to one decimal place.
@@ -80,6 +96,9 @@ class Output(object):
     def __init__(self, args):
         self.args = args
 
+    def close(self):
+        self.args.output.close()
+
     def parse_record(self, record):
         if record.fields.type != "R":
             raise astm.FormatError(
@@ -110,13 +129,7 @@ class Output(object):
 
         if result_type == "Insulin":
             # use different result types for different insulins
-            result_type = "{insulin_type}Insulin".format(
-                insulin_type={
-                    "0": "Unknown",
-                    "1": "FastActing",
-                    "2": "LongActing",
-                    "3": "Mixed"
-                }[units])
+            result_type = insulin_types[units]
 
         fields = {
             "Sequence": record.fields.sequence,
@@ -158,14 +171,88 @@ class Output(object):
 class CSV(Output):
     def __init__(self, args):
         super(CSV, self).__init__(args)
-        self.writer = csv.DictWriter(
-            args.output,
-            fieldnames=["Sequence", "Timestamp", "Type", "Value",
-                        "BelowScale", "AboveScale", "BeforeMeal", "AfterMeal",
-                        "DontFeelRight", "Fasting", "Sick", "Stress",
-                        "Activity", "HoursAfterMeal"])
+        self.writer = csv.DictWriter(args.output, fieldnames=fieldnames)
         self.writer.writeheader()
 
     def write_record(self, record):
         fields = self.parse_record(record)
-        self.writer.writerow(fields)
+        if fields is not None:
+            self.writer.writerow(fields)
+
+
+class JSONLines(Output):
+    """
+    Write each result as a JSON object on its own line, flushing the
+    output after a number of results or within a time interval of a
+    result being written, so a reader sees results during the download
+    rather than at the end.
+    """
+    encoders = {
+        str: json.encoder.encode_basestring_ascii,
+        unicode: json.encoder.encode_basestring_ascii,
+        bool: lambda v: "true" if v else "false",
+        int: str,
+        float: repr,
+    }
+
+    def __init__(self, args):
+        super(JSONLines, self).__init__(args)
+        self.file = args.output
+        self.flush_records = args.flush_records
+        self.flush_interval = args.flush_interval
+        self.pending = 0
+        # The timer flushes from another thread, so writes and flushes
+        # hold this lock.
+        self.lock = threading.Lock()
+        self.timer = None
+        # Keys are the same for every result, so encode them once.
+        self.keys = [(name, json.dumps(name) + ": ") for name in fieldnames]
+
+    def write_record(self, record):
+        fields = self.parse_record(record)
+        if fields is None:
+            return
+        # Numbers are text in the CSV output, but JSON has numbers.
+        fields["Sequence"] = int(fields["Sequence"])
+        fields["Value"] = float(fields["Value"])
+        encoders = self.encoders
+        line = "{" + ", ".join([
+            key + encoders[type(fields[name])](fields[name])
+            for name, key in self.keys if name in fields]) + "}\n"
+
+        with self.lock:
+            self.file.write(line)
+            self.pending += 1
+            if self.flush_records and self.pending >= self.flush_records:
+                self.flush()
+            elif self.flush_interval is not None and self.timer is None:
+                # Flush this result in time even if the meter goes
+                # quiet before any more arrive.
+                self.timer = threading.Timer(
+                    self.flush_interval, self.timed_flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        # called with self.lock held
+        self.file.flush()
+        self.pending = 0
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def timed_flush(self):
+        with self.lock:
+            if not self.file.closed:
+                self.flush()
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            super(JSONLines, self).close()
+
+
+formats = {
+    "csv": CSV,
+    "jsonl": JSONLines,
+}
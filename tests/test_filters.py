@@ -0,0 +1,113 @@
+"""
+Part of contourtool.py - read data from Contour Next USB blood glucose meters
+Copyright (C) 2016 Ben Jones <benj2579@gmail.com>
+See the COPYING file for licence information.
+"""
+
+import argparse
+import unittest
+from contourtool import astm, filters
+
+
+def result(record_id="^^^Glucose", units_ref="mmol/L^P",
+           timestamp="201610151200"):
+    return astm.Record("R|1|{}|5.5|{}||B||{}\r".format(
+        record_id, units_ref, timestamp))
+
+
+def record_filter(since=None, until=None, types=None, serial=None):
+    return filters.RecordFilter(argparse.Namespace(
+        since=since, until=until, serial=serial,
+        types=filters.parse_types(types) if types else None))
+
+
+class ParseDateTest(unittest.TestCase):
+    def test_date(self):
+        self.assertEqual(filters.parse_date("2016-10-15"), "201610150000")
+
+    def test_date_and_time(self):
+        self.assertEqual(
+            filters.parse_date("2016-10-15 08:30"), "201610150830")
+
+    def test_until_date_includes_whole_day(self):
+        self.assertEqual(filters.parse_until("2016-10-15"), "201610152359")
+
+    def test_until_time_is_exact(self):
+        self.assertEqual(
+            filters.parse_until("2016-10-15 08:30"), "201610150830")
+
+    def test_bad_date(self):
+        for text in ["2016-10", "15/10/2016", "2016-10-15 8:30"]:
+            self.assertRaises(
+                argparse.ArgumentTypeError, filters.parse_date, text)
+
+    def test_unknown_type(self):
+        self.assertRaises(
+            argparse.ArgumentTypeError, filters.parse_types, "Glucose,Foo")
+
+
+class WantsTest(unittest.TestCase):
+    def test_no_filters(self):
+        self.assertTrue(record_filter().wants(result()))
+
+    def test_other_records_always_wanted(self):
+        terminator = astm.Record("L|1||N\r")
+        self.assertTrue(record_filter(
+            since="201701010000", types="Carb").wants(terminator))
+
+    def test_since(self):
+        f = record_filter(since=filters.parse_date("2016-10-15 12:00"))
+        self.assertTrue(f.wants(result(timestamp="201610151200")))
+        self.assertFalse(f.wants(result(timestamp="201610151159")))
+
+    def test_until_end_of_day(self):
+        f = record_filter(until=filters.parse_until("2016-10-15"))
+        self.assertTrue(f.wants(result(timestamp="201610152359")))
+        self.assertFalse(f.wants(result(timestamp="201610160000")))
+
+    def test_bad_timestamp(self):
+        f = record_filter(since="201610150000")
+        self.assertRaises(
+            astm.FormatError, f.wants, result(timestamp="2016101612"))
+
+    def test_types(self):
+        f = record_filter(types="Carb")
+        self.assertTrue(f.wants(result("^^^Carb", "1^")))
+        self.assertFalse(f.wants(result("^^^Glucose")))
+        self.assertFalse(f.wants(result("^^^Insulin", "1^")))
+
+    def test_all_insulin(self):
+        f = record_filter(types="Insulin")
+        for code in "0123":
+            self.assertTrue(f.wants(result("^^^Insulin", code + "^")))
+
+    def test_insulin_subtype(self):
+        f = record_filter(types="Glucose,LongActingInsulin")
+        self.assertTrue(f.wants(result("^^^Insulin", "2^")))
+        self.assertFalse(f.wants(result("^^^Insulin", "1^")))
+        self.assertTrue(f.wants(result("^^^Glucose")))
+
+    def test_bad_record_id(self):
+        f = record_filter(types="Glucose")
+        self.assertRaises(astm.FormatError, f.wants, result("Glucose"))
+
+
+class WantsHeaderTest(unittest.TestCase):
+    header = astm.Record(
+        "H|\\^&||x|Bayer7410^1\\2\\3^7410-1^0000-|A=1|3|||||P|1|"
+        "20161019123000\r")
+
+    def test_serial(self):
+        f = record_filter(serial=["7410-1"])
+        self.assertTrue(f.wants_header(self.header, "7410-1"))
+        self.assertFalse(f.wants_header(self.header, "7410-2"))
+
+    def test_read_before_since(self):
+        self.assertFalse(record_filter(
+            since="201610200000").wants_header(self.header, "7410-1"))
+        self.assertTrue(record_filter(
+            since="201610190000").wants_header(self.header, "7410-1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
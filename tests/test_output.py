@@ -0,0 +1,54 @@
+"""
+Part of contourtool.py - read data from Contour Next USB blood glucose meters
+Copyright (C) 2016 Ben Jones <benj2579@gmail.com>
+See the COPYING file for licence information.
+"""
+
+import json
+import argparse
+import unittest
+from StringIO import StringIO
+from contourtool import astm, output
+
+
+def jsonl_args(**kwargs):
+    args = argparse.Namespace(
+        output=StringIO(), glucose_units="mmol/l", carb_units="g",
+        g_per_point=10.0, g_per_choice=15.0, flush_records=1,
+        flush_interval=None)
+    for name, value in kwargs.items():
+        setattr(args, name, value)
+    return args
+
+
+class JSONLinesTest(unittest.TestCase):
+    def write(self, *records):
+        args = jsonl_args()
+        out = output.JSONLines(args)
+        for record in records:
+            out.write_record(astm.Record(record))
+        return [json.loads(line)
+                for line in args.output.getvalue().splitlines()]
+
+    def test_numbers(self):
+        [glucose] = self.write(
+            "R|7|^^^Glucose|5.5|mmol/L^P||B/Z4||201610151200\r")
+        self.assertEqual(glucose["Sequence"], 7)
+        self.assertEqual(glucose["Value"], 5.5)
+        self.assertEqual(glucose["HoursAfterMeal"], 1.0)
+        self.assertIs(glucose["BeforeMeal"], True)
+        self.assertEqual(glucose["Timestamp"], "2016-10-15 12:00")
+
+    def test_no_marker_fields_for_insulin(self):
+        [insulin] = self.write("R|8|^^^Insulin|35|2^||||201610151200\r")
+        self.assertEqual(insulin["Type"], "LongActingInsulin")
+        self.assertEqual(insulin["Value"], 3.5)
+        self.assertNotIn("BeforeMeal", insulin)
+
+    def test_control_solution_skipped(self):
+        self.assertEqual(self.write(
+            "R|9|^^^Glucose|5.5|mmol/L^P||C||201610151200\r"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()